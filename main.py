@@ -3,7 +3,11 @@ import enum
 import json
 import logging
 import os
+import re
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 from typing import Any, NotRequired, TypedDict
 from urllib.parse import quote
@@ -12,10 +16,22 @@ from pymediainfo import MediaInfo
 
 ENV_PREFIX = "DEOVR_JSON_GEN_"
 
+# snapshot the relevant environment variables once at import, instead of an os.getenv lookup
+# per parse call on every (loop) generation
+ENV_KEYS = ("URL", "DIR", "EXT", "OUT", "IGNORE_SIZE", "IGNORE_DURATION", "MAX_WORKERS", "VERBOSE", "LOOP")
+WEB_KEYS = ("WEB_HOST", "WEB_PORT", "WEB_SSL")
+ENV: dict[str, str | None] = {
+    **{k: os.environ.get(f"{ENV_PREFIX}{k}") for k in ENV_KEYS},
+    **{k: os.environ.get(k) for k in WEB_KEYS},
+}
+
 DEFAULT_EXTENSIONS = {"mp4", "mkv", "avi", "mov", "wmv", "flv", "webm", "m4v", "mpg", "mpeg", "m2v", "ts"}
 DEFAULT_IGNORE_SIZE = 10  # in MB
 DEFAULT_IGNORE_DURATION = 60  # in seconds
 
+THUMBNAIL_URL = "https://www.iconsdb.com/icons/preview/red/video-play-xxl.png"
+LIBRARY_NAME = "Library"
+
 logging.basicConfig(format="%(asctime)s %(name)s %(message)s", level=logging.INFO)
 logger = logging.getLogger("deovr-json-gen")
 
@@ -25,6 +41,9 @@ class MediaInfoDict(TypedDict):
     duration: int  # in seconds
 
 
+MediaInfoCache = dict[str, dict[str, int]]  # path -> {st_size, st_mtime_ns, size, duration}
+
+
 class StereoMode(enum.StrEnum):
     MONOSCOPIC = "off"
     SIDE_BY_SIDE = "sbs"
@@ -69,49 +88,161 @@ class Scenes(TypedDict):
     scenes: list[Library]
 
 
+class Config(TypedDict):
+    directory: Path
+    out_file: Path
+    url: str
+    extensions: set[str]
+    ignore_params: MediaInfoDict
+    max_workers: int
+    pretty: bool
+    no_cache: bool
+    clear_cache: bool
+
+
+TRUE_VALUES = frozenset({"y", "yes", "t", "true", "on", "1"})
+FALSE_VALUES = frozenset({"n", "no", "f", "false", "off", "0"})
+
+
 def strtobool(value: Any) -> bool | None:
     """Convert a string representation of truth to true (1) or false (0).
     True values are 'y', 'yes', 't', 'true', 'on', and '1'; false values
-    are 'n', 'no', 'f', 'false', 'off', and '0'.  Raises ValueError if
+    are 'n', 'no', 'f', 'false', 'off', and '0'.  Returns None if
     'val' is anything else.
     """
-    val = str(value).lower()
-    if val in ("y", "yes", "t", "true", "on", "1"):
+    val = value.lower() if isinstance(value, str) else str(value).lower()
+    if val in TRUE_VALUES:
         return True
-    elif val in ("n", "no", "f", "false", "off", "0"):
+    elif val in FALSE_VALUES:
         return False
     else:
         return None
 
 
-def get_stereo_mode(path: Path) -> StereoMode:
-    file_name = path.name.lower()
-    if any([True for i in {"tb", "top-bottom", "over-under", "3dv"} if i in file_name]):
+# precompiled keyword patterns: one scan of the file name per check instead of one per keyword
+STEREO_TB_RE = re.compile("tb|top-bottom|over-under|3dv")
+STEREO_CUV_RE = re.compile("cuv|custom_uv")
+STEREO_MONO_RE = re.compile("off|2d|mono|single")
+SCREEN_F190_RE = re.compile("rf52|190|fisheye190")
+SCREEN_F200_RE = re.compile("mkx200|200|fisheye200")
+SCREEN_360_RE = re.compile("sphere|360|full")
+SCREEN_F180_RE = re.compile("fisheye")
+
+
+def get_stereo_mode(file_name: str) -> StereoMode:
+    if STEREO_TB_RE.search(file_name):
         return StereoMode.TOP_BOTTOM
-    elif any([True for i in {"cuv", "custom_uv"} if i in file_name]):
+    elif STEREO_CUV_RE.search(file_name):
         return StereoMode.CUSTOM_UV
-    elif any([True for i in {"off", "2d", "mono", "single"} if i in file_name]):
+    elif STEREO_MONO_RE.search(file_name):
         return StereoMode.MONOSCOPIC
     else:  # "sbs", "lr", "left-right", "side-by-side", "3dh"
         return StereoMode.SIDE_BY_SIDE
 
 
-def get_screen_type(path: Path) -> ScreenType:
-    file_name = path.name.lower()
-    if any([True for i in {"rf52", "190", "fisheye190"} if i in file_name]):
+def get_screen_type(file_name: str) -> ScreenType:
+    if SCREEN_F190_RE.search(file_name):
         return ScreenType.FISHEYE_190
-    elif any([True for i in {"mkx200", "200", "fisheye200"} if i in file_name]):
+    elif SCREEN_F200_RE.search(file_name):
         return ScreenType.FISHEYE_200
-    elif any([True for i in {"sphere", "360", "full"} if i in file_name]):
+    elif SCREEN_360_RE.search(file_name):
         return ScreenType.EQUIRECT_360
-    elif any([True for i in {"fisheye"} if i in file_name]):
+    elif SCREEN_F180_RE.search(file_name):
         return ScreenType.FISHEYE_180
     else:  # "dome", "180", "half"
         return ScreenType.EQUIRECT_180
 
 
-def get_media_info(path: Path) -> MediaInfoDict:
-    media_info = MediaInfo.parse(path)
+def load_media_info_cache(cache_file: Path) -> MediaInfoCache:
+    if not cache_file.is_file():
+        return {}
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        logger.warning(f"Ignoring unreadable media info cache: {cache_file}")
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_media_info_cache(cache: MediaInfoCache, cache_file: Path) -> None:
+    with open(cache_file, "w") as f:
+        json.dump(cache, f)
+
+
+def cache_media_info_library() -> None:
+    """Reuse the loaded libmediainfo library across MediaInfo.parse calls.
+
+    pymediainfo re-loads the library and redefines its ctypes prototypes on
+    every parse. Memoizing that load per thread (the library options are not
+    thread-safe) removes the per-file setup cost. The MediaInfo handle is NOT
+    reused: parse() closes and deletes the handle it is given, so each call
+    gets a fresh MediaInfo_New() one. Silently skipped if the private API
+    changes.
+    """
+    try:
+        original = MediaInfo._get_library.__func__  # type: ignore[attr-defined]
+    except AttributeError:
+        return
+
+    local = threading.local()
+
+    def cached(cls: type[MediaInfo], library_file: str | None = None) -> Any:
+        library = getattr(local, "library", None)
+        if library is None:
+            lib, handle, version_str, version = original(cls, library_file)
+            # don't keep the load-time handle around, the caller would destroy it
+            lib.MediaInfo_Close(handle)
+            lib.MediaInfo_Delete(handle)
+            library = (lib, version_str, version)
+            local.library = library
+        lib, version_str, version = library
+        return (lib, lib.MediaInfo_New(), version_str, version)
+
+    MediaInfo._get_library = classmethod(cached)  # type: ignore[method-assign]
+
+
+cache_media_info_library()
+
+
+def prefetch_header(path: Path, length: int = 1024 * 1024) -> None:
+    """Hint the kernel to read the file header ahead of the MediaInfo parse.
+
+    POSIX_FADV_WILLNEED kicks off asynchronous readahead, so with the thread
+    pool many headers are fetched in one batch instead of one blocking read
+    per parse. A no-op on platforms without posix_fadvise (e.g. Windows).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def get_media_info(path: Path, cache: MediaInfoCache | None = None) -> MediaInfoDict:
+    if cache is not None:
+        # a single stat is much cheaper than MediaInfo.parse, so unchanged files skip parsing
+        stat = path.stat()
+        # validate the entry shape too: a hand-edited or corrupt cache file must
+        # fall back to a re-parse, not crash a worker thread
+        cached = cache.get(str(path))
+        if (
+            isinstance(cached, dict)
+            and cached.get("st_size") == stat.st_size
+            and cached.get("st_mtime_ns") == stat.st_mtime_ns
+            and isinstance(cached.get("size"), int)
+            and isinstance(cached.get("duration"), int)
+        ):
+            return MediaInfoDict(size=cached["size"], duration=cached["duration"])
+
+    prefetch_header(path)
+    # parse_speed=0 reads only the container header, which is all the General track needs
+    media_info = MediaInfo.parse(path, parse_speed=0)
     general_tracks = [t for t in media_info.tracks if t.track_type == "General"]
     if not general_tracks:
         return MediaInfoDict(size=0, duration=0)
@@ -123,6 +254,14 @@ def get_media_info(path: Path) -> MediaInfoDict:
     size_in_mb = int(size_in_bytes / 1024 / 1024) if size_in_bytes else 0  # convert to MB
     duration_in_sec = int(duration_in_ms / 1000) if duration_in_ms else 0  # convert to seconds
 
+    if cache is not None:
+        cache[str(path)] = {
+            "st_size": stat.st_size,
+            "st_mtime_ns": stat.st_mtime_ns,
+            "size": size_in_mb,
+            "duration": duration_in_sec,
+        }
+
     return MediaInfoDict(size=size_in_mb, duration=duration_in_sec)
 
 
@@ -130,84 +269,155 @@ def ignore_scene(media_info: MediaInfoDict, ignore_params: MediaInfoDict) -> boo
     return media_info["size"] < ignore_params["size"] or media_info["duration"] < ignore_params["duration"]
 
 
-def get_relative_path(path: Path, directory: Path) -> str:
-    relative_path = path.relative_to(directory)
-    return "/".join(relative_path.parts)
+def get_relative_path(path: Path, dir_prefix: str) -> str:
+    # the directory is resolved and every path comes from walking it, so a plain
+    # prefix slice replaces Path.relative_to's part-by-part validation
+    return str(path)[len(dir_prefix) :].replace(os.sep, "/")
+
 
+# characters quote() passes through unchanged ("/" is safe by default in quote)
+SAFE_PATH_RE = re.compile(r"[A-Za-z0-9_.\-~/]*")
 
-def get_video_url(path: Path, directory: Path, domain_url: str) -> str:
-    return f"{domain_url}/{quote(get_relative_path(path, directory))}"
 
+def get_video_url(path: Path, dir_prefix: str, domain_url: str) -> str:
+    rel_path = get_relative_path(path, dir_prefix)
+    if SAFE_PATH_RE.fullmatch(rel_path):  # common case: nothing to escape, skip quote() entirely
+        return f"{domain_url}/{rel_path}"
+    return f"{domain_url}/{quote(rel_path)}"
 
-def get_scene(path: Path, directory: Path, domain_url: str, ignore_params: MediaInfoDict) -> Scene | None:
-    media_info = get_media_info(path)
+
+def get_scene(
+    path: Path,
+    dir_prefix: str,
+    domain_url: str,
+    ignore_params: MediaInfoDict,
+    cache: MediaInfoCache | None = None,
+) -> Scene | None:
+    # the size filter only needs a cheap stat, so apply it before the expensive media info parse
+    size_in_mb = int(path.stat().st_size / 1024 / 1024)
+    if size_in_mb < ignore_params["size"]:
+        logger.debug(f"Skipping {path} (size: {size_in_mb} MB)")
+        return None
+
+    media_info = get_media_info(path, cache)
 
     if ignore_scene(media_info, ignore_params):
         logger.debug(f"Skipping {path} (size: {media_info['size']} MB, duration: {media_info['duration']} sec)")
         return None
 
+    file_name = path.name.lower()  # lowercase once for both detectors
     return Scene(
         title=path.stem,
         videoLength=media_info["duration"],
-        thumbnailUrl="https://www.iconsdb.com/icons/preview/red/video-play-xxl.png",
-        video_url=get_video_url(path, directory, domain_url),
+        thumbnailUrl=THUMBNAIL_URL,
+        video_url=get_video_url(path, dir_prefix, domain_url),
         is3d=True,  # always true
-        stereoMode=get_stereo_mode(path),
-        screenType=get_screen_type(path),
+        stereoMode=get_stereo_mode(file_name),
+        screenType=get_screen_type(file_name),
     )
 
 
-def get_scenes(files: list[Path], directory: Path, domain_url: str, ignore_params: MediaInfoDict) -> list[Scene]:
-    scenes = []
-    for f in files:
-        scene = get_scene(f, directory, domain_url, ignore_params)
-        if scene:
-            scenes.append(scene)
-    return scenes
-
-
-def sort_files(files: list[Path]) -> list[Path]:
-    return sorted(files, key=lambda f: f.stat().st_mtime, reverse=True)
-
-
-def print_files(paths: list[Path]) -> None:
-    for p in paths:
-        logger.debug(f"+ {p}")
-
-
-def get_files(path: Path, ext: set[str] | None = None) -> list[Path]:
+def scene_pipeline(
+    directory: Path,
+    domain_url: str,
+    ignore_params: MediaInfoDict,
+    ext: set[str] | None = None,
+    max_workers: int | None = None,
+    cache: MediaInfoCache | None = None,
+    seen_files: set[str] | None = None,
+) -> list[Scene]:
+    """Walk the directory, parse media info and sort newest-first in one pass.
+
+    Every matched file path is recorded in `seen_files` (when given), so the
+    caller can prune cache entries for files that no longer exist.
+
+    Parse jobs are submitted to the thread pool as the walk discovers files
+    (MediaInfo.parse is I/O-bound and releases the GIL), so traversal and
+    parsing overlap instead of running as separate walk/sort/parse passes
+    over an intermediate file list. The mtime comes from the DirEntry of the
+    single os.scandir traversal, so no file is stat'd twice, and st_mtime_ns
+    compares as an int, which sorts faster than the float.
+    """
     if ext is None:
         ext = DEFAULT_EXTENSIONS
-
-    files: list[Path] = []
-    for e in ext:
-        files.extend(path.rglob(f"*.{e}"))
-
-    return files
-
-
-def gen_json_file(scenes: Scenes, out_file: Path, indent: int = 4) -> None:
-    with open(out_file, "w") as f:
-        json.dump(scenes, f, indent=indent)
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+
+    # one anchored regex scan per file name, with no per-file suffix allocation
+    ext_re = re.compile(r"\.(?:" + "|".join(re.escape(e) for e in ext) + r")$", re.IGNORECASE)
+
+    dir_prefix = str(directory).rstrip(os.sep) + os.sep  # computed once for the per-scene prefix slice
+    debug_files = logger.isEnabledFor(logging.DEBUG)
+
+    results: list[tuple[int, Future[Scene | None]]] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = os.scandir(current)
+            except OSError:  # unreadable or vanished directory: skip it, like rglob did
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(Path(entry.path))
+                            continue
+                        if not ext_re.search(entry.name):
+                            continue
+                        mtime_ns = entry.stat().st_mtime_ns
+                    except OSError:  # e.g. broken symlink or file deleted mid-walk
+                        continue
+                    path = Path(entry.path)
+                    if seen_files is not None:
+                        seen_files.add(str(path))
+                    if debug_files:
+                        logger.debug(f"+ {path}")
+                    future = executor.submit(get_scene, path, dir_prefix, domain_url, ignore_params, cache)
+                    results.append((mtime_ns, future))
+
+        results.sort(key=itemgetter(0), reverse=True)
+        return [scene for _, future in results if (scene := future.result())]
+
+
+def gen_json_file(scenes: Scenes, out_file: Path, pretty: bool = False) -> None:
+    if pretty:
+        data = json.dumps(scenes, indent=4).encode()
+    else:  # compact separators skip the encoder's pretty-print path
+        data = json.dumps(scenes, separators=(",", ":")).encode()
+
+    # serialize once and replace atomically: a single write syscall instead of one
+    # per encoder chunk, and loop-mode consumers never see a torn file
+    tmp_file = out_file.with_suffix(out_file.suffix + ".tmp")
+    tmp_file.write_bytes(data)
+    os.replace(tmp_file, out_file)
 
 
 def parse_ignore_params(args: argparse.Namespace) -> MediaInfoDict:
     size: int | None = args.ignore_size
     if size is None:
-        size = int(os.getenv(f"{ENV_PREFIX}IGNORE_SIZE", DEFAULT_IGNORE_SIZE))
+        size = int(ENV["IGNORE_SIZE"] or DEFAULT_IGNORE_SIZE)
     duration: int | None = args.ignore_duration
     if duration is None:
-        duration = int(os.getenv(f"{ENV_PREFIX}IGNORE_DURATION", DEFAULT_IGNORE_DURATION))
+        duration = int(ENV["IGNORE_DURATION"] or DEFAULT_IGNORE_DURATION)
     return MediaInfoDict(size=size, duration=duration)
 
 
+def parse_max_workers(args: argparse.Namespace) -> int:
+    max_workers: int | None = args.max_workers
+    if max_workers is None:
+        max_workers = int(ENV["MAX_WORKERS"] or 0) or min(32, (os.cpu_count() or 1) * 4)
+    return max_workers
+
+
 def parse_extensions(args: argparse.Namespace) -> set[str]:
     # get extensions from command line arguments first
     ext = set(args.ext) if args.ext else set()
 
     # if no extensions were provided, try to get them from environment variables
     if not ext:
-        ext_str = os.getenv(f"{ENV_PREFIX}EXT")
+        ext_str = ENV["EXT"]
         ext_list = ext_str.split(",") if ext_str else []
         ext = {e.strip() for e in ext_list}
 
@@ -221,13 +431,13 @@ def parse_extensions(args: argparse.Namespace) -> set[str]:
 def parse_domain_url(args: argparse.Namespace) -> str:
     # get domain url from command line arguments first
     # if no domain url were provided, try to get them from environment variables
-    url: str = args.url or os.getenv(f"{ENV_PREFIX}URL", "")
+    url: str = args.url or ENV["URL"] or ""
 
     # if no domain url were found, build from web server details
     if not url:
-        host = os.getenv("WEB_HOST")
-        port = os.getenv("WEB_PORT")
-        ssl = strtobool(os.getenv("WEB_SSL"))  # True/False but also return None if not set or invalid value
+        host = ENV["WEB_HOST"]
+        port = ENV["WEB_PORT"]
+        ssl = strtobool(ENV["WEB_SSL"])  # True/False but also return None if not set or invalid value
 
         # for cli users ensure --url is provided
         if not all([host, port, ssl is not None]):
@@ -250,7 +460,7 @@ def parse_out_file(args: argparse.Namespace) -> Path:
     out_file_str: str = args.out
 
     if not out_file_str:
-        out_file_str = os.getenv(f"{ENV_PREFIX}OUT", "deovr")
+        out_file_str = ENV["OUT"] or "deovr"
 
     out_path = Path(out_file_str)
 
@@ -271,7 +481,7 @@ def parse_directory(args: argparse.Namespace) -> Path:
     path_str = args.dir
 
     if not path_str:
-        dirs_str = os.getenv(f"{ENV_PREFIX}DIR")
+        dirs_str = ENV["DIR"]
         path_str = dirs_str.strip() if dirs_str else ""
 
     # if no directory were found, raise an error and exit
@@ -300,14 +510,23 @@ def parse_args() -> argparse.Namespace:
     ignore_dur_help = "Ignore files smaller than X seconds (set to 0 to disable) [default: 60]"
     parser.add_argument("--ignore-duration", "-d", nargs="?", type=int, help=ignore_dur_help)
 
+    max_workers_help = "Number of parallel workers for media info parsing [default: min(32, cpu_count * 4)]"
+    parser.add_argument("--max-workers", "-w", nargs="?", type=int, help=max_workers_help)
+
+    pretty_help = "Indent the output JSON (slower for large libraries)"
+    parser.add_argument("--pretty", "-p", action="store_true", help=pretty_help)
+
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk media info cache")
+    parser.add_argument("--clear-cache", action="store_true", help="Delete the on-disk media info cache first")
+
     parser.add_argument("--loop", "-l", nargs="?", default=0, type=int, help="Generate every X seconds")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
     return parser.parse_args()
 
 
-def generate(args: argparse.Namespace) -> None:
-    logger.info("Generating DeoVR JSON...")
-
+def parse_config(args: argparse.Namespace) -> Config:
+    # materialize the full configuration once at startup, so loop mode does not
+    # re-run the parse helpers (env lookups, Path construction) every iteration
     directory = parse_directory(args)
     logger.info(f"Input directory: {directory.resolve()}")
 
@@ -323,28 +542,69 @@ def generate(args: argparse.Namespace) -> None:
     ignore_params = parse_ignore_params(args)
     logger.info(f"Ignore Parameters: {ignore_params}")
 
-    files = sort_files(get_files(directory, extensions))
-    print_files(files)
+    max_workers = parse_max_workers(args)
+    logger.info(f"Max Workers: {max_workers}")
+
+    return Config(
+        directory=directory,
+        out_file=out_file,
+        url=url,
+        extensions=extensions,
+        ignore_params=ignore_params,
+        max_workers=max_workers,
+        pretty=args.pretty,
+        no_cache=args.no_cache,
+        clear_cache=args.clear_cache,
+    )
+
+
+def generate(config: Config) -> None:
+    logger.info("Generating DeoVR JSON...")
 
-    scene_list = get_scenes(files, directory, url, ignore_params)
-    library = Library(name="Library", list=scene_list)
+    out_file = config["out_file"]
+    cache_file = out_file.parent / "_media_info_cache.json"
+    if config["clear_cache"] and cache_file.is_file():
+        cache_file.unlink()
+        logger.info(f"Cleared media info cache: {cache_file}")
+    cache = None if config["no_cache"] else load_media_info_cache(cache_file)
+
+    seen_files: set[str] = set()
+    scene_list = scene_pipeline(
+        config["directory"],
+        config["url"],
+        config["ignore_params"],
+        config["extensions"],
+        config["max_workers"],
+        cache,
+        seen_files,
+    )
+    library = Library(name=LIBRARY_NAME, list=scene_list)
     scenes = Scenes(scenes=[library])
-    logger.debug(f"Scenes: {scenes}")
+    if logger.isEnabledFor(logging.DEBUG):  # formatting the whole dict is expensive for large libraries
+        logger.debug(f"Scenes: {scenes}")
     logger.info(f"Generating for {len(scene_list)} scenes ...")
 
-    gen_json_file(scenes, out_file)
+    gen_json_file(scenes, out_file, pretty=config["pretty"])
     logger.info(f"DeoVR JSON generated successfully: {out_file.resolve()}")
 
+    if cache is not None:
+        # drop entries for renamed/deleted files, so loop mode cannot grow the cache without bound
+        for key in cache.keys() - seen_files:
+            del cache[key]
+        save_media_info_cache(cache, cache_file)
+        logger.debug(f"Media info cache saved: {cache_file}")
+
 
 if __name__ == "__main__":
     parsed_args = parse_args()
-    verbose = parsed_args.verbose or strtobool(os.getenv(f"{ENV_PREFIX}VERBOSE"))
+    verbose = parsed_args.verbose or strtobool(ENV["VERBOSE"])
     logger.setLevel(logging.DEBUG if verbose else logging.INFO)
 
-    loop = parsed_args.loop or int(os.getenv(f"{ENV_PREFIX}LOOP", 0))
+    loop = parsed_args.loop or int(ENV["LOOP"] or 0)
+    config = parse_config(parsed_args)
     while True:
         logger.info("=" * 50)
-        generate(parsed_args)
+        generate(config)
 
         if not loop:
             break